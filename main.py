@@ -1,22 +1,61 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Query
-from fastapi.responses import StreamingResponse, JSONResponse
-from pydantic import BaseModel, Field, field_validator
-from typing import Optional, Literal, List, Union
+from fastapi import FastAPI, HTTPException, UploadFile, File, Query, Request, Response, Header
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from pydantic import BaseModel, Field, StringConstraints
+from typing import Annotated, Optional, Literal, List, Dict, Union, get_args
 import barcode
-from barcode.writer import ImageWriter
-import qrcode
-from qrcode.image.pil import PilImage
+from barcode.errors import BarcodeError
+from barcode.writer import ImageWriter, SVGWriter, mm2px, pt2mm
+import segno
 import io
-import base64
-from PIL import Image
+import functools
+import hashlib
+import re
+import struct
+import threading
+from PIL import Image, ImageColor, ImageFont
 import cv2
 import numpy as np
 from pyzbar import pyzbar
 import uvicorn
 import traceback
+import asyncio
+import multiprocessing
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+
+try:
+    # SIMD base64 encoder; byte-identical to the stdlib one
+    from pybase64 import b64encode_as_string
+except ImportError:
+    from base64 import b64encode
+    
+    def b64encode_as_string(data: bytes, altchars: Optional[bytes] = None) -> str:
+        return b64encode(data, altchars).decode('ascii')
+
+try:
+    # SIMD deflate and checksums behind the stdlib zlib API
+    from zlib_ng import zlib_ng as zlib
+except ImportError:
+    import zlib
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm up the render threads and run image scans in worker processes for the lifetime of the app"""
+    await warm_render_pool()
+    app.state.scan_pool = new_scan_pool()
+    yield
+    app.state.scan_pool.shutdown(cancel_futures=True)
+    app.state.scan_pool = None
 
 # Initialize FastAPI app with comprehensive OpenAPI metadata
 app = FastAPI(
+    lifespan=lifespan,
     title="Barcode & QR Code Generator API",
     description="""
     A comprehensive API for generating barcodes, QR codes, and scanning them from images.
@@ -40,7 +79,11 @@ app = FastAPI(
     },
 )
 
-# Supported barcode formats
+# Supported barcode formats, spelled out for type checkers and the OpenAPI schema
+BarcodeFormat = Literal[
+    "code128", "code39", "ean8", "ean13", "ean14", "jan",
+    "upc", "isbn10", "isbn13", "issn", "itf", "pzn",
+]
 BARCODE_FORMATS = {
     "code128": barcode.Code128,
     "code39": barcode.Code39,
@@ -55,20 +98,168 @@ BARCODE_FORMATS = {
     "itf": barcode.ITF,
     "pzn": barcode.PZN,
 }
+BARCODE_FORMAT_NAMES = get_args(BarcodeFormat)
+
+# Data requirements for the numeric formats, the check digit being optional
+DATA_PATTERNS = {
+    "ean8": (re.compile(r"\d{7,8}", re.ASCII), "7 or 8 digits"),
+    "ean13": (re.compile(r"\d{12,13}", re.ASCII), "12 or 13 digits"),
+    "ean14": (re.compile(r"\d{13,14}", re.ASCII), "13 or 14 digits"),
+    "jan": (re.compile(r"\d{12,13}", re.ASCII), "12 or 13 digits"),
+    "upc": (re.compile(r"\d{11,12}", re.ASCII), "11 or 12 digits"),
+    "isbn10": (re.compile(r"\d{9}[\dX]?", re.ASCII), "9 digits plus an optional check character"),
+    "isbn13": (re.compile(r"\d{12,13}", re.ASCII), "12 or 13 digits"),
+    "issn": (re.compile(r"\d{7}[\dX]?", re.ASCII), "7 digits plus an optional check character"),
+    "itf": (re.compile(r"\d+", re.ASCII), "digits only"),
+    "pzn": (re.compile(r"\d{6,7}", re.ASCII), "6 or 7 digits"),
+}
+
+# Formats whose data python-barcode accepts with hyphens (e.g. "3-12-517154-7"),
+# dropping them before encoding
+HYPHENATED_FORMATS = frozenset({"isbn10", "isbn13", "issn"})
+
+# Media types for the barcode image formats
+IMAGE_MEDIA_TYPES = {
+    "png": "image/png",
+    "svg": "image/svg+xml",
+}
+
+# Largest accepted /scan-image upload, in bytes, and the chunk size it is read in
+MAX_UPLOAD_SIZE = 8 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 64 * 1024
+# Largest accepted /scan-image request body: the upload plus room for the multipart framing
+MAX_UPLOAD_BODY_SIZE = MAX_UPLOAD_SIZE + 64 * 1024
+
+# Base64 alphabet substitutions for url_safe requests
+BASE64_URL_ALTCHARS = b"-_"
+
+# Most barcodes accepted in a single /create-barcode/batch request
+MAX_BATCH_SIZE = 256
+
+# Uploaded images larger than this (in pixels, either side) are downscaled before scanning
+SCAN_MAX_DIMENSION = 1600
+
+# Rendered barcodes are a pure function of their inputs, so clients may cache them
+CACHE_CONTROL = "public, max-age=86400"
+
+# Everything besides the request that the rendered bytes depend on, folded into
+# ETags so that upgrading a renderer or switching deflate backends (which
+# compress differently) does not leave clients revalidating stale bytes
+RENDER_VERSION = ":".join((
+    f"python-barcode-{barcode.version}",
+    f"segno-{segno.__version__}",
+    f"pillow-{Image.__version__}",
+    f"{zlib.__name__}-{getattr(zlib, 'ZLIBNG_VERSION', None) or getattr(zlib, 'ZLIB_RUNTIME_VERSION', '')}",
+))
+
+# Barcode and QR rendering is CPU-bound, so give it its own pool sized to the
+# machine rather than sharing the much larger default threadpool
+RENDER_THREADS = os.cpu_count() or 1
+RENDER_POOL = ThreadPoolExecutor(max_workers=RENDER_THREADS, thread_name_prefix="render")
+
+# python-barcode's messages for inputs it rejected, keyed by a digest of the
+# render inputs, so render cache misses on known-bad input are refused without
+# rendering again. Render threads share it, hence the lock.
+MAX_REJECTED_BARCODES = 4096
+REJECTED_BARCODES: "OrderedDict[bytes, str]" = OrderedDict()
+REJECTED_BARCODES_LOCK = threading.Lock()
+
+# Middleware
+
+class WeakETagGZipMiddleware(GZipMiddleware):
+    """GZipMiddleware that weakens the ETag of the responses it compresses
+    
+    A strong ETag promises byte-identical bodies, which the gzip and identity
+    encodings of a response are not. As with nginx, the compressed one is sent
+    with a weak W/ ETag instead, and a 304 echoes the weak form back to clients
+    that revalidate with it.
+    """
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await super().__call__(scope, receive, send)
+            return
+        
+        if_none_match = Headers(scope=scope).get("if-none-match", "")
+        
+        async def send_with_weak_etag(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(raw=message["headers"])
+                etag = headers.get("etag")
+                if etag is not None and not etag.startswith("W/"):
+                    compressed = headers.get("content-encoding") == "gzip"
+                    revalidated_weak = message["status"] == 304 and f"W/{etag}" in if_none_match
+                    if compressed or revalidated_weak:
+                        headers["etag"] = f"W/{etag}"
+            await send(message)
+        
+        await super().__call__(scope, receive, send_with_weak_etag)
+
+class UploadSizeLimitMiddleware:
+    """Reject request bodies over max_size on one path before they are parsed
+    
+    Starlette spools a multipart upload to disk in full before the endpoint
+    runs, so the limit has to be enforced while the body is still arriving:
+    up front from Content-Length, and on the received bytes for chunked bodies.
+    """
+    
+    def __init__(self, app, path: str, max_size: int):
+        self.app = app
+        self.path = path
+        self.max_size = max_size
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] != self.path:
+            await self.app(scope, receive, send)
+            return
+        
+        detail = f"Image too large. Maximum size is {MAX_UPLOAD_SIZE // (1024 * 1024)} MB"
+        content_length = Headers(scope=scope).get("content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_size:
+            response = JSONResponse(status_code=413, content={"detail": detail})
+            await response(scope, receive, send)
+            return
+        
+        received = 0
+        
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_size:
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+        
+        await self.app(scope, limited_receive, send)
+
+# base64 images and SVGs shrink well even at the fastest level; PNG responses are
+# already deflated and are left alone by the middleware
+app.add_middleware(WeakETagGZipMiddleware, minimum_size=512, compresslevel=1)
+
+# /scan-image is the only endpoint that takes uploads, so only its bodies are capped
+app.add_middleware(UploadSizeLimitMiddleware, path="/scan-image", max_size=MAX_UPLOAD_BODY_SIZE)
 
 # Pydantic Schemas
 
 class BarcodeGenerationRequest(BaseModel):
     """Request schema for barcode generation"""
-    data: str = Field(..., description="Data to encode in the barcode", min_length=1)
-    format: Literal[
-        "code128", "code39", "ean8", "ean13", "ean14", 
-        "jan", "upc", "isbn10", "isbn13", "issn", "itf", "pzn"
-    ] = Field(..., description="Barcode format to generate")
+    data: Annotated[str, StringConstraints(strip_whitespace=True)] = Field(
+        ..., description="Data to encode in the barcode", min_length=1
+    )
+    format: BarcodeFormat = Field(..., description="Barcode format to generate")
     return_format: Literal["base64", "image"] = Field(
         default="base64", 
         description="Return format: base64 string or downloadable image file"
     )
+    image_format: Literal["png", "svg"] = Field(
+        default="png",
+        description="Image format: PNG raster or SVG vector image"
+    )
+    url_safe: bool = Field(
+        default=False,
+        description="Use the URL-safe base64 alphabet ('-' and '_' instead of '+' and '/')"
+    )
     
     # Styling options
     width: Optional[float] = Field(default=2.0, gt=0, description="Module width")
@@ -79,11 +270,6 @@ class BarcodeGenerationRequest(BaseModel):
     background_color: Optional[str] = Field(default="white", description="Background color")
     foreground_color: Optional[str] = Field(default="black", description="Foreground color")
 
-    @field_validator('data')
-    @classmethod
-    def validate_data(cls, v):
-        return v.strip()
-
 class QRCodeGenerationRequest(BaseModel):
     """Request schema for QR code generation"""
     data: str = Field(..., description="Data to encode in the QR code", min_length=1)
@@ -91,6 +277,14 @@ class QRCodeGenerationRequest(BaseModel):
         default="base64",
         description="Return format: base64 string or downloadable image file"
     )
+    image_format: Literal["png", "svg"] = Field(
+        default="png",
+        description="Image format: PNG raster or SVG vector image"
+    )
+    url_safe: bool = Field(
+        default=False,
+        description="Use the URL-safe base64 alphabet ('-' and '_' instead of '+' and '/')"
+    )
     
     # QR Code specific options
     version: Optional[int] = Field(default=1, ge=1, le=40, description="QR code version (1-40)")
@@ -111,6 +305,22 @@ class GenerationResponse(BaseModel):
     image_base64: Optional[str] = Field(None, description="Base64 encoded image (only if return_format=base64)")
     message: str = Field(..., description="Status message")
 
+class BarcodeBatchRequest(BaseModel):
+    """Request schema for generating several barcodes at once"""
+    barcodes: List[BarcodeGenerationRequest] = Field(
+        ...,
+        min_length=1,
+        max_length=MAX_BATCH_SIZE,
+        description=f"Barcodes to generate (at most {MAX_BATCH_SIZE}); return_format is ignored and images are always base64"
+    )
+
+class BarcodeBatchResponse(BaseModel):
+    """Response schema for batch barcode generation"""
+    success: bool = Field(..., description="Whether every barcode was generated")
+    count: int = Field(..., description="Number of barcodes generated successfully")
+    results: List[GenerationResponse] = Field(..., description="Result for each requested barcode, in request order")
+    message: str = Field(..., description="Status message")
+
 class ScanResult(BaseModel):
     """Schema for individual scan result"""
     data: str = Field(..., description="Decoded data from the code")
@@ -137,33 +347,285 @@ class HealthResponse(BaseModel):
     service: str = Field(..., description="Service name")
     version: str = Field(..., description="API version")
 
+class ApiInfoResponse(BaseModel):
+    """Response schema for API information"""
+    name: str = Field(..., description="API name")
+    version: str = Field(..., description="API version")
+    description: str = Field(..., description="API description")
+    endpoints: Dict[str, str] = Field(..., description="Paths of the available endpoints")
+
 # Helper Functions
 
-def create_barcode_image(request: BarcodeGenerationRequest) -> io.BytesIO:
-    """Generate barcode image and return as BytesIO"""
-    try:
-        barcode_class = BARCODE_FORMATS[request.format]
-        
-        writer = ImageWriter()
-        writer.format = 'PNG'
-        
-        options = {
-            'module_width': request.width,
-            'module_height': request.height,
-            'quiet_zone': request.quiet_zone,
-            'font_size': request.font_size,
-            'text_distance': request.text_distance,
-            'background': request.background_color,
-            'foreground': request.foreground_color,
-        }
-        
-        code = barcode_class(request.data, writer=writer)
+# Writer option name -> BarcodeGenerationRequest styling field
+_WRITER_OPTION_FIELDS = (
+    ('module_width', 'width'),
+    ('module_height', 'height'),
+    ('quiet_zone', 'quiet_zone'),
+    ('font_size', 'font_size'),
+    ('text_distance', 'text_distance'),
+    ('background', 'background_color'),
+    ('foreground', 'foreground_color'),
+)
+
+_DEFAULT_STYLE = tuple(
+    BarcodeGenerationRequest.model_fields[field].default
+    for _, field in _WRITER_OPTION_FIELDS
+)
+_DEFAULT_OPTIONS = tuple(sorted(
+    (option, value) for (option, _), value in zip(_WRITER_OPTION_FIELDS, _DEFAULT_STYLE)
+))
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# Runs of identical rows are deflated in blocks of this many rows, once per row size
+REPEAT_BLOCK_ROWS = 16
+
+def _png_chunk(tag: bytes, body: bytes) -> bytes:
+    """Length-prefixed, CRC-suffixed PNG chunk"""
+    return struct.pack('>I', len(body)) + tag + body + struct.pack('>I', zlib.crc32(body, zlib.crc32(tag)))
+
+@functools.lru_cache(maxsize=64)
+def _deflated_repeat_rows(row_size: int, rows: int) -> bytes:
+    """Raw deflate of Up-filtered rows that equal the row above, ending on a full flush"""
+    compressor = zlib.compressobj(1, zlib.DEFLATED, -15, 9, zlib.Z_RLE)
+    return compressor.compress((b'\x02' + bytes(row_size)) * rows) + compressor.flush(zlib.Z_FULL_FLUSH)
+
+def encode_png(pixels: np.ndarray) -> bytes:
+    """Encode an 8-bit grayscale or RGB pixel array as PNG
+    
+    Barcode images are mostly rows identical to the one above, which the Up
+    filter turns into zeros. Those runs are not deflated again on every call:
+    after a full flush the deflate stream can restart anywhere, so the cached
+    deflate of a block of such rows is simply repeated.
+    """
+    height, width = pixels.shape[:2]
+    rows = pixels.reshape(height, -1)
+    row_size = rows.shape[1]
+    filtered = np.empty((height, row_size + 1), dtype=np.uint8)
+    filtered[:, 0] = 2
+    filtered[0, 1:] = rows[0]
+    np.subtract(rows[1:], rows[:-1], out=filtered[1:, 1:])
+    
+    repeats = np.zeros(height, dtype=bool)
+    repeats[1:] = ~filtered[1:, 1:].any(axis=1)
+    cuts = (np.flatnonzero(np.diff(repeats)) + 1).tolist()
+    
+    compressor = zlib.compressobj(1, zlib.DEFLATED, -15, 9, zlib.Z_RLE)
+    idat = [b'\x78\x01']
+    for start, end in zip([0] + cuts, cuts + [height]):
+        blocks, rest = divmod(end - start, REPEAT_BLOCK_ROWS)
+        if repeats[start] and blocks:
+            idat.append(compressor.flush(zlib.Z_FULL_FLUSH))
+            idat.append(_deflated_repeat_rows(row_size, REPEAT_BLOCK_ROWS) * blocks)
+            start = end - rest
+        idat.append(compressor.compress(filtered[start:end]))
+    idat.append(compressor.flush())
+    idat.append(struct.pack('>I', zlib.adler32(filtered)))
+    
+    color_type = 2 if pixels.ndim == 3 else 0
+    return b''.join((
+        PNG_SIGNATURE,
+        _png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, color_type, 0, 0, 0)),
+        _png_chunk(b'IDAT', b''.join(idat)),
+        _png_chunk(b'IEND', b''),
+    ))
+
+class FastImageWriter(ImageWriter):
+    """ImageWriter that favours PNG encode speed over compression ratio"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Loaded fonts by pixel size; writers are per-thread so this needs no lock
+        self._fonts = {}
+    
+    def _get_font(self, font_size: int) -> ImageFont.FreeTypeFont:
+        font = self._fonts.get(font_size)
+        if font is None:
+            font = ImageFont.truetype(self.font_path, font_size)
+            self._fonts[font_size] = font
+        return font
+    
+    def _paint_text(self, xpos, ypos):
+        # Same as ImageWriter._paint_text, minus reading the font file on every call
+        barcodetext = self.human if self.human != "" else self.text
         
-        buffer = io.BytesIO()
-        code.write(buffer, options=options)
-        buffer.seek(0)
+        font_size = int(mm2px(pt2mm(self.font_size), self.dpi))
+        if font_size <= 0:
+            return
+        font = self._get_font(font_size)
+        for subtext in barcodetext.split("\n"):
+            pos = (
+                mm2px(xpos, self.dpi),
+                mm2px(ypos, self.dpi),
+            )
+            self._draw.text(pos, subtext, font=font, fill=self.foreground, anchor="md")
+            ypos += pt2mm(self.font_size) / 2 + self.text_line_distance
+    
+    def encode(self, content) -> bytes:
+        """Encode a rendered barcode image straight to PNG bytes"""
+        return encode_png(np.asarray(content))
+    
+    def write(self, content, fp):
+        fp.write(self.encode(content))
+
+def _is_grayscale(color: str) -> bool:
+    """Whether a PIL colour string is a shade of gray"""
+    r, g, b = ImageColor.getrgb(color)[:3]
+    return r == g == b
+
+_writer_local = threading.local()
+
+def _get_image_writer() -> FastImageWriter:
+    """Return this thread's FastImageWriter, creating it on first use"""
+    writer = getattr(_writer_local, 'writer', None)
+    if writer is None:
+        writer = FastImageWriter(format='PNG')
+        _writer_local.writer = writer
+    return writer
+
+def _writer_options(request: BarcodeGenerationRequest) -> tuple:
+    """Return the writer options for a request as a sorted, hashable tuple"""
+    style = tuple(getattr(request, field) for _, field in _WRITER_OPTION_FIELDS)
+    if style == _DEFAULT_STYLE:
+        return _DEFAULT_OPTIONS
+    return tuple(sorted(
+        (option, value) for (option, _), value in zip(_WRITER_OPTION_FIELDS, style)
+    ))
+
+def remember_rejections(render):
+    """Remember the BarcodeErrors a render raises and raise them again for the same input
+    
+    Only python-barcode's own rejections are kept: they are a pure function of
+    the input, unlike e.g. a MemoryError or a failure loading the font. Goes
+    under the lru_cache, so it only runs on cache misses.
+    """
+    @functools.wraps(render)
+    def wrapper(format: str, data: str, opts: tuple) -> bytes:
+        key = repr((render.__name__, format, data, opts))
+        key = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        with REJECTED_BARCODES_LOCK:
+            message = REJECTED_BARCODES.get(key)
+        if message is not None:
+            raise BarcodeError(message)
+        try:
+            return render(format, data, opts)
+        except BarcodeError as e:
+            with REJECTED_BARCODES_LOCK:
+                REJECTED_BARCODES[key] = str(e)
+                if len(REJECTED_BARCODES) > MAX_REJECTED_BARCODES:
+                    REJECTED_BARCODES.popitem(last=False)
+            raise
+    return wrapper
+
+@functools.lru_cache(maxsize=4096)
+@remember_rejections
+def _render_png(format: str, data: str, opts: tuple) -> bytes:
+    """Render a barcode to PNG bytes, cached on (format, data, options)"""
+    options = dict(opts)
+    writer = _get_image_writer()
+    # Draw single-channel when both colours are gray; otherwise keep full RGB
+    if _is_grayscale(options['background']) and _is_grayscale(options['foreground']):
+        writer.mode = 'L'
+    else:
+        writer.mode = 'RGB'
+    
+    code = BARCODE_FORMATS[format](data, writer=writer)
+    
+    # The encoder already hands back the whole PNG, so skip the BytesIO round trip
+    return writer.encode(code.render(options))
+
+@functools.lru_cache(maxsize=4096)
+@remember_rejections
+def _render_svg(format: str, data: str, opts: tuple) -> bytes:
+    """Render a barcode to SVG bytes, cached on (format, data, options)"""
+    code = BARCODE_FORMATS[format](data, writer=SVGWriter())
+    
+    buffer = io.BytesIO()
+    code.write(buffer, options=dict(opts))
+    
+    return buffer.getvalue()
+
+def request_etag(request: BaseModel) -> str:
+    """Strong ETag for a generation request, which fully determines the response body"""
+    key = f"{RENDER_VERSION}:{type(request).__name__}:{request.model_dump_json()}"
+    return '"' + hashlib.blake2b(key.encode('utf-8'), digest_size=16).hexdigest() + '"'
+
+def base64_altchars(request: BaseModel) -> Optional[bytes]:
+    """Base64 alphabet substitutions for a generation request, None for the standard one"""
+    return BASE64_URL_ALTCHARS if request.url_safe else None
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header value lists the given ETag
+    
+    Comparison is weak, so the W/ form WeakETagGZipMiddleware gives gzipped
+    responses matches too. "*" is never a match: the ETag is derived from the
+    request before it is rendered, so it says nothing about whether a
+    representation exists.
+    """
+    if not if_none_match:
+        return False
+    return any(
+        tag.strip().removeprefix("W/") == etag
+        for tag in if_none_match.split(",")
+    )
+
+def conditional_response(method: str, if_none_match: Optional[str], etag: str, headers: dict) -> Optional[Response]:
+    """Response for a request whose If-None-Match already lists the ETag, else None
+    
+    Per RFC 9110 section 13.1.2 that is 304 Not Modified for GET and HEAD, and
+    412 Precondition Failed for any other method.
+    """
+    if not etag_matches(if_none_match, etag):
+        return None
+    if method in ("GET", "HEAD"):
+        return Response(status_code=304, headers=headers)
+    return Response(status_code=412, headers=headers)
+
+def accept_quality(accept: str, media_type: str) -> float:
+    """The q-value an Accept header gives a media type, 0 if it is not listed"""
+    quality = 0.0
+    for media_range in accept.split(","):
+        name, *params = media_range.split(";")
+        if name.strip().lower() != media_type:
+            continue
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+    return quality
+
+def negotiate_image_format(request, accept: Optional[str], given_fields):
+    """Serve SVG to clients that prefer it over PNG, unless image_format was given
+    
+    given_fields are the fields the client actually sent: the body's
+    model_fields_set, or the query parameter names for GET, where every field
+    of a query model counts as set.
+    """
+    if request.return_format != "image" or "image_format" in given_fields or not accept:
+        return request
+    svg_quality = accept_quality(accept, "image/svg+xml")
+    if svg_quality > 0 and svg_quality > accept_quality(accept, "image/png"):
+        return request.model_copy(update={"image_format": "svg"})
+    return request
+
+def create_barcode_image(request: BarcodeGenerationRequest) -> bytes:
+    """Generate barcode image and return its PNG or SVG bytes"""
+    try:
+        if request.format in DATA_PATTERNS:
+            pattern, requirement = DATA_PATTERNS[request.format]
+            data = request.data
+            if request.format in HYPHENATED_FORMATS:
+                data = data.replace("-", "")
+            if not pattern.fullmatch(data):
+                raise ValueError(f"{request.format} data must be {requirement}")
         
-        return buffer
+        if request.image_format == "svg":
+            return _render_svg(request.format, request.data, _writer_options(request))
+        return _render_png(request.format, request.data, _writer_options(request))
         
     except Exception as e:
         raise HTTPException(
@@ -171,128 +633,242 @@ def create_barcode_image(request: BarcodeGenerationRequest) -> io.BytesIO:
             detail=f"Failed to generate barcode: {str(e)}"
         )
 
-def create_qr_code_image(request: QRCodeGenerationRequest) -> io.BytesIO:
-    """Generate QR code image and return as BytesIO"""
+@functools.lru_cache(maxsize=1024)
+def _render_qr(
+    data: str,
+    error: str,
+    version: Optional[int],
+    kind: str,
+    scale: int,
+    border: int,
+    dark: Optional[tuple],
+    light: Optional[tuple],
+) -> bytes:
+    """Render a QR code to PNG or SVG bytes, cached on all of its inputs"""
+    # Treat the requested version as a minimum, growing it to fit the data
     try:
-        # Map error correction levels
-        error_correction_map = {
-            "L": qrcode.constants.ERROR_CORRECT_L,
-            "M": qrcode.constants.ERROR_CORRECT_M,
-            "Q": qrcode.constants.ERROR_CORRECT_Q,
-            "H": qrcode.constants.ERROR_CORRECT_H,
-        }
-        
-        qr = qrcode.QRCode(
-            version=request.version,
-            error_correction=error_correction_map[request.error_correction],
-            box_size=request.box_size,
-            border=request.border,
-        )
-        
-        qr.add_data(request.data)
-        qr.make(fit=True)
-        
-        img = qr.make_image(
-            fill_color=request.fill_color,
-            back_color=request.back_color,
-            image_factory=PilImage
+        qr = segno.make_qr(data, error=error, version=version, boost_error=False)
+    except segno.DataOverflowError:
+        qr = segno.make_qr(data, error=error, boost_error=False)
+    
+    buffer = io.BytesIO()
+    qr.save(buffer, kind=kind, scale=scale, border=border, dark=dark, light=light)
+    
+    return buffer.getvalue()
+
+def _qr_color(color: Optional[str]) -> Optional[tuple]:
+    """Parse a PIL colour string into the RGB(A) tuple segno takes, None being transparent"""
+    # segno only knows hex and named colours, so parse with PIL as the qrcode images did
+    if color is None or color.lower() == "transparent":
+        return None
+    return ImageColor.getrgb(color)
+
+def create_qr_code_image(request: QRCodeGenerationRequest) -> bytes:
+    """Generate QR code image and return its PNG or SVG bytes"""
+    try:
+        return _render_qr(
+            request.data,
+            request.error_correction,
+            request.version,
+            request.image_format,
+            request.box_size,
+            request.border,
+            _qr_color(request.fill_color),
+            _qr_color(request.back_color),
         )
         
-        buffer = io.BytesIO()
-        img.save(buffer, format='PNG')
-        buffer.seek(0)
-        
-        return buffer
-        
     except Exception as e:
         raise HTTPException(
             status_code=400,
             detail=f"Failed to generate QR code: {str(e)}"
         )
 
-def scan_codes_from_image(image_data: bytes) -> List[ScanResult]:
-    """Scan and decode barcodes/QR codes from image data"""
+def _decode_grayscale(image_data: bytes, draft_size: Optional[int] = None) -> tuple:
+    """Decode image data to an 8-bit grayscale PIL image
+    
+    Returns the image and the full (width, height) of the upload. With
+    draft_size set, JPEGs are decoded at a reduced scale no smaller than it.
+    """
     try:
-        # Convert bytes to numpy array
-        nparr = np.frombuffer(image_data, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        if image is None:
+        image = Image.open(io.BytesIO(image_data))
+        size = image.size
+        if draft_size:
+            image.draft('L', (draft_size, draft_size))
+        return image.convert('L'), size
+    except Image.UnidentifiedImageError:
+        # Fall back to OpenCV for formats Pillow cannot read
+        gray = cv2.imdecode(np.frombuffer(image_data, np.uint8), cv2.IMREAD_GRAYSCALE)
+        if gray is None:
             raise ValueError("Invalid image format")
-        
-        # Convert to grayscale for better detection
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        
-        # Decode barcodes and QR codes
+        return Image.fromarray(gray), (gray.shape[1], gray.shape[0])
+
+def scan_codes_from_image(image_data: bytes) -> List[ScanResult]:
+    """Scan and decode barcodes/QR codes from image data
+    
+    Runs in the scan worker processes, so it only takes and returns picklable
+    values and raises plain exceptions rather than HTTPException.
+    """
+    gray, (width, height) = _decode_grayscale(image_data, draft_size=SCAN_MAX_DIMENSION)
+    
+    # Scan large photos at reduced resolution, falling back to full size
+    # if that finds nothing (e.g. a small code in a large frame)
+    scale = 1.0
+    decoded_objects = []
+    if max(width, height) > SCAN_MAX_DIMENSION:
+        scale = SCAN_MAX_DIMENSION / max(width, height)
+        small = gray.resize(
+            (max(1, round(width * scale)), max(1, round(height * scale))),
+            Image.Resampling.BOX,
+        )
+        decoded_objects = pyzbar.decode(small)
+        if not decoded_objects and gray.size != (width, height):
+            gray, _ = _decode_grayscale(image_data)
+    if not decoded_objects:
+        scale = 1.0
         decoded_objects = pyzbar.decode(gray)
+    
+    results = []
+    for obj in decoded_objects:
+        # Convert polygon points to list format in original image coordinates
+        polygon = [[round(point.x / scale), round(point.y / scale)] for point in obj.polygon]
         
-        results = []
-        for obj in decoded_objects:
-            # Convert polygon points to list format
-            polygon = [[point.x, point.y] for point in obj.polygon]
-            
-            result = ScanResult(
-                data=obj.data.decode('utf-8'),
-                type=obj.type,
-                quality=getattr(obj, 'quality', None),
-                polygon=polygon
-            )
-            results.append(result)
-        
-        return results
-        
-    except Exception as e:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Failed to scan image: {str(e)}"
+        result = ScanResult(
+            data=obj.data.decode('utf-8'),
+            type=obj.type,
+            quality=getattr(obj, 'quality', None),
+            polygon=polygon
         )
+        results.append(result)
+    
+    return results
+
+async def run_in_render_pool(func, *args):
+    """Run a rendering function in RENDER_POOL without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(RENDER_POOL, func, *args)
+
+def _warm_render_thread(barrier: threading.Barrier) -> None:
+    """Set up this render thread's image writer and default font"""
+    # Hold every thread until all have started, so each warm-up lands on its own thread
+    barrier.wait()
+    # Bypass the render cache so it isn't seeded with a throwaway barcode
+    _render_png.__wrapped__("code128", "WARMUP", _DEFAULT_OPTIONS)
+
+async def warm_render_pool():
+    """Start every render thread ahead of the first request, rather than on it"""
+    barrier = threading.Barrier(RENDER_THREADS)
+    await asyncio.gather(*(
+        run_in_render_pool(_warm_render_thread, barrier) for _ in range(RENDER_THREADS)
+    ))
+
+def new_scan_pool() -> ProcessPoolExecutor:
+    """Create the worker processes image scans run in"""
+    # Spawned rather than forked, as the server process is already multi-threaded
+    return ProcessPoolExecutor(
+        max_workers=os.cpu_count(),
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+
+scan_pool_lock = threading.Lock()
+
+def replace_broken_scan_pool(broken: ProcessPoolExecutor) -> None:
+    """Swap in a fresh scan pool after a worker died, e.g. a zbar crash or an OOM kill"""
+    with scan_pool_lock:
+        # Requests that were running on the same pool all fail together; only replace it once
+        if app.state.scan_pool is broken:
+            broken.shutdown(wait=False, cancel_futures=True)
+            app.state.scan_pool = new_scan_pool()
 
 # API Endpoints
 
+API_INFO = ApiInfoResponse(
+    name="Barcode & QR Code Generator API",
+    version="2.0.0",
+    description="Generate and scan barcodes and QR codes",
+    endpoints={
+        "create_barcode": "/create-barcode",
+        "create_barcode_batch": "/create-barcode/batch",
+        "create_qr_code": "/create-qr-code", 
+        "scan_image": "/scan-image",
+        "supported_formats": "/supported-formats",
+        "health": "/health",
+        "documentation": "/docs"
+    }
+)
+
 @app.get("/", 
+         response_model=ApiInfoResponse,
          summary="API Information",
          description="Get basic information about the API and available endpoints")
 async def get_api_info():
     """Root endpoint with API information"""
-    return {
-        "name": "Barcode & QR Code Generator API",
-        "version": "2.0.0",
-        "description": "Generate and scan barcodes and QR codes",
-        "endpoints": {
-            "create_barcode": "/create-barcode",
-            "create_qr_code": "/create-qr-code", 
-            "scan_image": "/scan-image",
-            "supported_formats": "/supported-formats",
-            "health": "/health",
-            "documentation": "/docs"
-        }
-    }
+    return API_INFO
 
 @app.post("/create-barcode",
           response_model=GenerationResponse,
           summary="Generate Barcode",
-          description="Generate a barcode in various formats with customizable styling options")
-async def create_barcode(request: BarcodeGenerationRequest):
+          description="Generate a barcode in various formats as a PNG or SVG image with customizable styling options")
+async def create_barcode(
+    request: BarcodeGenerationRequest,
+    if_none_match: Optional[str] = Header(None, description="ETag of a previously returned barcode; answered with 412"),
+    accept: Optional[str] = Header(None, description="image/svg+xml selects SVG when image_format is not set"),
+):
+    """Generate a barcode with the specified format and options"""
+    return await barcode_response(request, "POST", if_none_match, accept, request.model_fields_set)
+
+@app.get("/create-barcode",
+         response_model=GenerationResponse,
+         summary="Generate Barcode (GET)",
+         description="Same as POST /create-barcode with the options as query parameters, so that browsers and caches can revalidate with If-None-Match")
+async def get_barcode(
+    http_request: Request,
+    request: Annotated[BarcodeGenerationRequest, Query()],
+    if_none_match: Optional[str] = Header(None, description="ETag of a previously returned barcode; answered with 304"),
+    accept: Optional[str] = Header(None, description="image/svg+xml selects SVG when image_format is not set"),
+):
     """Generate a barcode with the specified format and options"""
+    return await barcode_response(request, "GET", if_none_match, accept, http_request.query_params.keys())
+
+async def barcode_response(
+    request: BarcodeGenerationRequest,
+    method: str,
+    if_none_match: Optional[str],
+    accept: Optional[str],
+    given_fields,
+) -> Response:
+    """Generate a barcode response, honouring If-None-Match and Accept"""
     try:
-        image_buffer = create_barcode_image(request)
+        request = negotiate_image_format(request, accept, given_fields)
+        etag = request_etag(request)
+        cache_headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Vary": "Accept"}
+        
+        # The client already holds this exact barcode
+        response = conditional_response(method, if_none_match, etag, cache_headers)
+        if response is not None:
+            return response
+        
+        image_bytes = await run_in_render_pool(create_barcode_image, request)
         
         if request.return_format == "image":
-            return StreamingResponse(
-                io.BytesIO(image_buffer.getvalue()),
-                media_type="image/png",
+            return Response(
+                content=image_bytes,
+                media_type=IMAGE_MEDIA_TYPES[request.image_format],
                 headers={
-                    "Content-Disposition": f"attachment; filename=barcode_{request.format}_{request.data}.png"
+                    "Content-Disposition": f"attachment; filename=barcode_{request.format}_{request.data}.{request.image_format}",
+                    **cache_headers,
                 }
             )
         else:
-            image_base64 = base64.b64encode(image_buffer.getvalue()).decode('utf-8')
-            return GenerationResponse(
-                success=True,
-                format=request.format,
-                data=request.data,
-                image_base64=image_base64,
-                message="Barcode generated successfully"
+            return Response(
+                content=GenerationResponse(
+                    success=True,
+                    format=request.format,
+                    data=request.data,
+                    image_base64=b64encode_as_string(image_bytes, base64_altchars(request)),
+                    message="Barcode generated successfully"
+                ).model_dump_json(),
+                media_type="application/json",
+                headers=cache_headers
             )
             
     except HTTPException:
@@ -300,31 +876,116 @@ async def create_barcode(request: BarcodeGenerationRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+@app.post("/create-barcode/batch",
+          response_model=BarcodeBatchResponse,
+          summary="Generate Barcodes in Batch",
+          description=f"Generate up to {MAX_BATCH_SIZE} barcodes in one request, returned as base64 images")
+async def create_barcode_batch(batch: BarcodeBatchRequest):
+    """Generate several barcodes concurrently, reporting failures per barcode"""
+    try:
+        rendered = await asyncio.gather(
+            *(run_in_render_pool(create_barcode_image, request) for request in batch.barcodes),
+            return_exceptions=True
+        )
+        
+        results = []
+        for request, image_bytes in zip(batch.barcodes, rendered):
+            if isinstance(image_bytes, HTTPException):
+                results.append(GenerationResponse(
+                    success=False,
+                    format=request.format,
+                    data=request.data,
+                    message=image_bytes.detail
+                ))
+            elif isinstance(image_bytes, BaseException):
+                raise image_bytes
+            else:
+                results.append(GenerationResponse(
+                    success=True,
+                    format=request.format,
+                    data=request.data,
+                    image_base64=b64encode_as_string(image_bytes, base64_altchars(request)),
+                    message="Barcode generated successfully"
+                ))
+        
+        count = sum(result.success for result in results)
+        return BarcodeBatchResponse(
+            success=count == len(results),
+            count=count,
+            results=results,
+            message=f"Generated {count} of {len(results)} barcode(s)."
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
 @app.post("/create-qr-code",
           response_model=GenerationResponse, 
           summary="Generate QR Code",
-          description="Generate a QR code with customizable error correction and styling options")
-async def create_qr_code(request: QRCodeGenerationRequest):
+          description="Generate a QR code as a PNG or SVG image with customizable error correction and styling options")
+async def create_qr_code(
+    request: QRCodeGenerationRequest,
+    if_none_match: Optional[str] = Header(None, description="ETag of a previously returned QR code; answered with 412"),
+    accept: Optional[str] = Header(None, description="image/svg+xml selects SVG when image_format is not set"),
+):
+    """Generate a QR code with the specified options"""
+    return await qr_code_response(request, "POST", if_none_match, accept, request.model_fields_set)
+
+@app.get("/create-qr-code",
+         response_model=GenerationResponse,
+         summary="Generate QR Code (GET)",
+         description="Same as POST /create-qr-code with the options as query parameters, so that browsers and caches can revalidate with If-None-Match")
+async def get_qr_code(
+    http_request: Request,
+    request: Annotated[QRCodeGenerationRequest, Query()],
+    if_none_match: Optional[str] = Header(None, description="ETag of a previously returned QR code; answered with 304"),
+    accept: Optional[str] = Header(None, description="image/svg+xml selects SVG when image_format is not set"),
+):
     """Generate a QR code with the specified options"""
+    return await qr_code_response(request, "GET", if_none_match, accept, http_request.query_params.keys())
+
+async def qr_code_response(
+    request: QRCodeGenerationRequest,
+    method: str,
+    if_none_match: Optional[str],
+    accept: Optional[str],
+    given_fields,
+) -> Response:
+    """Generate a QR code response, honouring If-None-Match and Accept"""
     try:
-        image_buffer = create_qr_code_image(request)
+        request = negotiate_image_format(request, accept, given_fields)
+        etag = request_etag(request)
+        cache_headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Vary": "Accept"}
+        
+        # The client already holds this exact QR code
+        response = conditional_response(method, if_none_match, etag, cache_headers)
+        if response is not None:
+            return response
+        
+        image_bytes = await run_in_render_pool(create_qr_code_image, request)
         
         if request.return_format == "image":
-            return StreamingResponse(
-                io.BytesIO(image_buffer.getvalue()),
-                media_type="image/png",
+            return Response(
+                content=image_bytes,
+                media_type=IMAGE_MEDIA_TYPES[request.image_format],
                 headers={
-                    "Content-Disposition": f"attachment; filename=qrcode_{hash(request.data)}.png"
+                    "Content-Disposition": f"attachment; filename=qrcode_{hash(request.data)}.{request.image_format}",
+                    **cache_headers,
                 }
             )
         else:
-            image_base64 = base64.b64encode(image_buffer.getvalue()).decode('utf-8')
-            return GenerationResponse(
-                success=True,
-                format="qrcode",
-                data=request.data,
-                image_base64=image_base64,
-                message="QR code generated successfully"
+            return Response(
+                content=GenerationResponse(
+                    success=True,
+                    format="qrcode",
+                    data=request.data,
+                    image_base64=b64encode_as_string(image_bytes, base64_altchars(request)),
+                    message="QR code generated successfully"
+                ).model_dump_json(),
+                media_type="application/json",
+                headers=cache_headers
             )
             
     except HTTPException:
@@ -346,11 +1007,42 @@ async def scan_image(image: UploadFile = File(..., description="Image file conta
                 detail="File must be an image (JPEG, PNG, etc.)"
             )
         
-        # Read image data
-        image_data = await image.read()
+        # Oversized request bodies were already refused by UploadSizeLimitMiddleware;
+        # this catches an upload over the limit by less than the multipart framing allowance
+        too_large = HTTPException(
+            status_code=413,
+            detail=f"Image too large. Maximum size is {MAX_UPLOAD_SIZE // (1024 * 1024)} MB"
+        )
+        if image.size is not None and image.size > MAX_UPLOAD_SIZE:
+            raise too_large
+        buffer = bytearray()
+        while chunk := await image.read(UPLOAD_CHUNK_SIZE):
+            if len(buffer) + len(chunk) > MAX_UPLOAD_SIZE:
+                raise too_large
+            buffer += chunk
+        image_data = bytes(buffer)
         
-        # Scan for codes
-        results = scan_codes_from_image(image_data)
+        # Scan for codes in a worker process, or in the threadpool when the
+        # app was started without its lifespan (e.g. a bare TestClient)
+        scan_pool = getattr(app.state, "scan_pool", None)
+        try:
+            if scan_pool is not None:
+                loop = asyncio.get_running_loop()
+                results = await loop.run_in_executor(scan_pool, scan_codes_from_image, image_data)
+            else:
+                results = await run_in_threadpool(scan_codes_from_image, image_data)
+        except BrokenProcessPool:
+            # Not retried: the image may well be what crashed the worker
+            replace_broken_scan_pool(scan_pool)
+            raise HTTPException(
+                status_code=503,
+                detail="Image scanner restarted after a worker failure, please retry"
+            )
+        except Exception as e:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Failed to scan image: {str(e)}"
+            )
         
         return ScanResponse(
             success=True,
@@ -364,13 +1056,11 @@ async def scan_image(image: UploadFile = File(..., description="Image file conta
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
-@app.get("/supported-formats",
-         response_model=SupportedFormatsResponse,
-         summary="Get Supported Formats",
-         description="Get a list of all supported barcode formats and QR code capabilities")
-async def get_supported_formats():
-    """Get information about supported barcode formats and capabilities"""
-    format_details = {
+# The supported formats never change at runtime, so serialize the response once
+SUPPORTED_FORMATS_RESPONSE = SupportedFormatsResponse(
+    barcode_formats=list(BARCODE_FORMAT_NAMES),
+    qr_code_supported=True,
+    format_details={
         "code128": "Code 128 - Variable length, alphanumeric",
         "code39": "Code 39 - Variable length, alphanumeric", 
         "ean8": "EAN-8 - 8 digits",
@@ -385,11 +1075,19 @@ async def get_supported_formats():
         "pzn": "PZN - Pharmazentralnummer",
         "qrcode": "QR Code - Variable length, high capacity 2D code"
     }
-    
-    return SupportedFormatsResponse(
-        barcode_formats=list(BARCODE_FORMATS.keys()),
-        qr_code_supported=True,
-        format_details=format_details
+)
+SUPPORTED_FORMATS_JSON = SUPPORTED_FORMATS_RESPONSE.model_dump_json().encode('utf-8')
+
+@app.get("/supported-formats",
+         response_model=SupportedFormatsResponse,
+         summary="Get Supported Formats",
+         description="Get a list of all supported barcode formats and QR code capabilities")
+async def get_supported_formats():
+    """Get information about supported barcode formats and capabilities"""
+    return Response(
+        content=SUPPORTED_FORMATS_JSON,
+        media_type="application/json",
+        headers={"Cache-Control": CACHE_CONTROL}
     )
 
 @app.get("/health",
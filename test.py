@@ -1,41 +1,56 @@
 # test_barcode_api.py
 import pytest
-from fastapi.testclient import TestClient
+import pytest_asyncio
+import httpx
+import main
 from main import app
+from fastapi import HTTPException
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import base64
-import json
+import io
+from PIL import Image, ImageColor
+import numpy as np
 
-client = TestClient(app)
+pytestmark = pytest.mark.asyncio
 
-def test_root_endpoint():
+@pytest_asyncio.fixture
+async def client():
+    """Async client calling the app in-process, so tests don't block on each other"""
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+        yield c
+
+async def test_root_endpoint(client):
     """Test root endpoint"""
-    response = client.get("/")
+    response = await client.get("/")
     assert response.status_code == 200
     data = response.json()
-    assert "message" in data
-    assert "supported_formats" in data
+    assert "name" in data
+    assert "create_barcode" in data["endpoints"]
 
-def test_health_check():
+async def test_health_check(client):
     """Test health check endpoint"""
-    response = client.get("/health")
+    response = await client.get("/health")
     assert response.status_code == 200
     assert response.json()["status"] == "healthy"
 
-def test_get_supported_formats():
+async def test_get_supported_formats(client):
     """Test getting supported formats"""
-    response = client.get("/formats")
+    response = await client.get("/supported-formats")
     assert response.status_code == 200
     data = response.json()
-    assert "supported_formats" in data
-    assert "code128" in data["supported_formats"]
+    assert "barcode_formats" in data
+    assert "code128" in data["barcode_formats"]
 
-def test_generate_barcode_code128():
+async def test_generate_barcode_code128(client):
     """Test generating Code 128 barcode"""
     payload = {
         "data": "TEST123",
         "format": "code128"
     }
-    response = client.post("/generate", json=payload)
+    response = await client.post("/create-barcode", json=payload)
     assert response.status_code == 200
     data = response.json()
     assert data["success"] == True
@@ -47,87 +62,381 @@ def test_generate_barcode_code128():
     image_data = base64.b64decode(data["image_base64"])
     assert len(image_data) > 0
 
-def test_generate_barcode_ean13():
+async def test_generate_barcode_ean13(client):
     """Test generating EAN-13 barcode"""
     payload = {
         "data": "123456789012",
         "format": "ean13"
     }
-    response = client.post("/generate", json=payload)
+    response = await client.post("/create-barcode", json=payload)
     assert response.status_code == 200
 
-def test_generate_barcode_upc():
+async def test_generate_barcode_upc(client):
     """Test generating UPC barcode"""
     payload = {
         "data": "12345678901",
         "format": "upc"
     }
-    response = client.post("/generate", json=payload)
+    response = await client.post("/create-barcode", json=payload)
     assert response.status_code == 200
 
-def test_generate_barcode_image_endpoint():
+async def test_generate_barcode_image_endpoint(client):
     """Test generating barcode as image file"""
     payload = {
         "data": "TEST123",
-        "format": "code128"
+        "format": "code128",
+        "return_format": "image"
     }
-    response = client.post("/generate/image", json=payload)
+    response = await client.post("/create-barcode", json=payload)
     assert response.status_code == 200
     assert response.headers["content-type"] == "image/png"
 
-def test_quick_generate():
-    """Test quick generate with query parameters"""
-    response = client.get("/generate/quick?data=TEST123&format=code128")
+async def test_generate_qr_code(client):
+    """Test generating a QR code"""
+    response = await client.post("/create-qr-code", json={"data": "TEST123"})
     assert response.status_code == 200
+    data = response.json()
+    assert data["success"] == True
+    assert data["format"] == "qrcode"
+    assert len(base64.b64decode(data["image_base64"])) > 0
 
-def test_quick_generate_image():
-    """Test quick generate returning image"""
-    response = client.get("/generate/quick?data=TEST123&format=code128&return_image=true")
+async def test_generate_qr_code_image(client):
+    """Test generating a QR code as image file"""
+    response = await client.post("/create-qr-code", json={"data": "TEST123", "return_format": "image"})
     assert response.status_code == 200
     assert response.headers["content-type"] == "image/png"
 
-def test_invalid_format():
+@pytest.mark.parametrize("colors", [
+    {"fill_color": "rgb(255,0,0)"},
+    {"fill_color": "hsl(0,100%,50%)"},
+    {"fill_color": "#123456", "back_color": "transparent"},
+])
+async def test_qr_code_colors(client, colors):
+    """QR code colours accept any PIL colour string"""
+    response = await client.post("/create-qr-code", json={"data": "TEST123", "return_format": "image", **colors})
+    assert response.status_code == 200
+    image = Image.open(io.BytesIO(response.content)).convert("RGBA")
+    assert image.getpixel((0, 0))[3] == (0 if colors.get("back_color") == "transparent" else 255)
+    # The first finder pattern's corner is drawn in the fill colour
+    assert image.getpixel((40, 40))[:3] == ImageColor.getrgb(colors["fill_color"])
+
+async def test_etag_round_trip(client):
+    """A GET revalidated with its ETag gets 304; the same on POST gets 412"""
+    params = {"data": "TEST123", "format": "code128", "return_format": "image"}
+    response = await client.get("/create-barcode", params=params)
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    
+    response = await client.get("/create-barcode", params=params, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert response.content == b""
+    
+    response = await client.post("/create-barcode", json=params, headers={"If-None-Match": etag})
+    assert response.status_code == 412
+
+async def test_qr_code_etag_round_trip(client):
+    """QR codes revalidate the same way as barcodes"""
+    params = {"data": "TEST123"}
+    etag = (await client.get("/create-qr-code", params=params)).headers["etag"]
+    response = await client.get("/create-qr-code", params=params, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+async def test_etag_changes_with_renderer(client, monkeypatch):
+    """An ETag from before a renderer or deflate backend change no longer matches"""
+    params = {"data": "TEST123", "format": "code128", "return_format": "image"}
+    etag = (await client.get("/create-barcode", params=params)).headers["etag"]
+    monkeypatch.setattr(main, "RENDER_VERSION", main.RENDER_VERSION.replace("zlib", "zlib_ng.zlib_ng"))
+    response = await client.get("/create-barcode", params=params, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+async def test_gzipped_response_has_weak_etag(client):
+    """Gzip and identity bodies differ, so only the identity one keeps a strong ETag"""
+    params = {"data": "TEST123", "format": "code128", "image_format": "svg"}
+    identity = await client.get("/create-barcode", params=params, headers={"Accept-Encoding": "identity"})
+    gzipped = await client.get("/create-barcode", params=params, headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in identity.headers
+    assert gzipped.headers["content-encoding"] == "gzip"
+    assert gzipped.headers["etag"] == f"W/{identity.headers['etag']}"
+    
+    # Either form revalidates, and the 304 echoes the one the client holds
+    for etag in (identity.headers["etag"], gzipped.headers["etag"]):
+        response = await client.get(
+            "/create-barcode", params=params,
+            headers={"Accept-Encoding": "gzip", "If-None-Match": etag},
+        )
+        assert response.status_code == 304
+        assert response.headers["etag"] == etag
+
+async def test_etag_wildcard_does_not_skip_validation(client):
+    """If-None-Match: * is not a match, so invalid data is still rejected"""
+    payload = {"data": "12x", "format": "ean13"}
+    response = await client.post("/create-barcode", json=payload, headers={"If-None-Match": "*"})
+    assert response.status_code == 400
+    response = await client.get("/create-barcode", params=payload, headers={"If-None-Match": "*"})
+    assert response.status_code == 400
+
+async def test_barcode_format_names_match_writers():
+    """The format Literal lists exactly the formats there is a writer for"""
+    assert main.BARCODE_FORMAT_NAMES == tuple(main.BARCODE_FORMATS)
+
+async def test_invalid_format(client):
     """Test invalid barcode format"""
     payload = {
         "data": "TEST123",
         "format": "invalid_format"
     }
-    response = client.post("/generate", json=payload)
+    response = await client.post("/create-barcode", json=payload)
     assert response.status_code == 422  # Validation error
 
-def test_empty_data():
+async def test_empty_data(client):
     """Test empty data"""
     payload = {
         "data": "",
         "format": "code128"
     }
-    response = client.post("/generate", json=payload)
+    response = await client.post("/create-barcode", json=payload)
     assert response.status_code == 422  # Validation error
 
-def test_invalid_ean13_length():
+async def test_invalid_ean13_length(client):
     """Test invalid EAN-13 data length"""
     payload = {
         "data": "12345",  # Too short for EAN-13
         "format": "ean13"
     }
-    response = client.post("/generate", json=payload)
+    response = await client.post("/create-barcode", json=payload)
     assert response.status_code == 400
 
-def test_custom_styling():
+@pytest.mark.parametrize("format, data", [
+    ("isbn10", "3-12-517154-7"),
+    ("isbn13", "978-3-16-148410-0"),
+    ("issn", "0317-8471"),
+])
+async def test_hyphenated_data(client, format, data):
+    """ISBN and ISSN data may be written with hyphens"""
+    response = await client.post("/create-barcode", json={"data": data, "format": format})
+    assert response.status_code == 200
+    assert response.json()["data"] == data
+
+async def test_custom_styling(client):
     """Test custom barcode styling"""
     payload = {
         "data": "STYLED123",
         "format": "code128",
         "width": 3.0,
         "height": 20.0,
-        "background": "white",
-        "foreground": "black",
+        "background_color": "white",
+        "foreground_color": "black",
         "font_size": 12
     }
-    response = client.post("/generate", json=payload)
+    response = await client.post("/create-barcode", json=payload)
     assert response.status_code == 200
     assert response.json()["success"] == True
 
+async def test_rejected_barcodes_are_bounded(monkeypatch):
+    """Concurrent render failures keep the rejected-input cache within its cap"""
+    monkeypatch.setattr(main, "MAX_REJECTED_BARCODES", 64)
+    monkeypatch.setattr(main, "REJECTED_BARCODES", OrderedDict())
+    
+    def reject(i):
+        # python-barcode itself rejects ISBN-13s without the 978/979 prefix
+        request = main.BarcodeGenerationRequest(data=f"{100000000000 + i}", format="isbn13")
+        with pytest.raises(HTTPException) as exc_info:
+            main.create_barcode_image(request)
+        return exc_info.value.status_code
+    
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        assert set(pool.map(reject, range(2000))) == {400}
+    assert len(main.REJECTED_BARCODES) == 64
+    # Keys are digests, so they stay small whatever the size of the data
+    assert all(len(key) == 16 for key in main.REJECTED_BARCODES)
+
+async def test_rejected_barcode_is_remembered(client, monkeypatch):
+    """A repeated bad barcode gets the same 400 without rendering it again"""
+    monkeypatch.setattr(main, "REJECTED_BARCODES", OrderedDict())
+    payload = {"data": "1234567890128", "format": "isbn13"}
+    first = await client.post("/create-barcode", json=payload)
+    assert len(main.REJECTED_BARCODES) == 1
+    monkeypatch.setattr(main, "BARCODE_FORMATS", {})
+    second = await client.post("/create-barcode", json=payload)
+    assert first.status_code == second.status_code == 400
+    assert first.json() == second.json()
+
+async def test_transient_render_errors_are_not_remembered(client, monkeypatch):
+    """Failures other than python-barcode's rejections stay out of the cache"""
+    monkeypatch.setattr(main, "REJECTED_BARCODES", OrderedDict())
+    
+    def out_of_memory(*args, **kwargs):
+        raise MemoryError()
+    
+    monkeypatch.setitem(main.BARCODE_FORMATS, "code128", out_of_memory)
+    payload = {"data": "TRANSIENT1", "format": "code128"}
+    assert (await client.post("/create-barcode", json=payload)).status_code == 400
+    assert len(main.REJECTED_BARCODES) == 0
+    monkeypatch.undo()
+    assert (await client.post("/create-barcode", json=payload)).status_code == 200
+
+def png_upload(width=20, height=20):
+    """A blank PNG as a multipart file for /scan-image"""
+    buffer = io.BytesIO()
+    Image.new("L", (width, height), 255).save(buffer, "PNG")
+    return {"image": ("blank.png", buffer.getvalue(), "image/png")}
+
+async def test_scan_pool_replaced_after_worker_failure(client, monkeypatch):
+    """A dead scan worker gets a 503 and a fresh pool for the next request"""
+    class BrokenPool(ThreadPoolExecutor):
+        def submit(self, *args, **kwargs):
+            raise BrokenProcessPool("A worker process terminated abruptly")
+    
+    broken = BrokenPool(max_workers=1)
+    monkeypatch.setattr(main.app.state, "scan_pool", broken, raising=False)
+    monkeypatch.setattr(main, "new_scan_pool", lambda: ThreadPoolExecutor(max_workers=1))
+    
+    response = await client.post("/scan-image", files=png_upload())
+    assert response.status_code == 503
+    assert main.app.state.scan_pool is not broken
+    
+    response = await client.post("/scan-image", files=png_upload())
+    assert response.status_code == 200
+    assert response.json()["codes_found"] == 0
+
+@pytest.mark.parametrize("size", [main.MAX_UPLOAD_SIZE + 1, main.MAX_UPLOAD_BODY_SIZE + 1])
+async def test_scan_upload_too_large(client, size):
+    """Uploads over 8 MB are refused, whether by Content-Length or when read"""
+    files = {"image": ("large.png", b"\0" * size, "image/png")}
+    response = await client.post("/scan-image", files=files)
+    assert response.status_code == 413
+
+async def test_scan_chunked_upload_too_large(client):
+    """A body without Content-Length is cut off once it passes the limit"""
+    async def body():
+        yield b'--x\r\nContent-Disposition: form-data; name="image"; filename="large.png"\r\n'
+        yield b"Content-Type: image/png\r\n\r\n"
+        for _ in range(main.MAX_UPLOAD_BODY_SIZE // main.UPLOAD_CHUNK_SIZE + 2):
+            yield b"\0" * main.UPLOAD_CHUNK_SIZE
+    
+    headers = {"content-type": "multipart/form-data; boundary=x"}
+    response = await client.post("/scan-image", content=body(), headers=headers)
+    assert response.status_code == 413
+
+async def test_batch_mixed_results(client):
+    """A batch reports each barcode's outcome in request order"""
+    payload = {"barcodes": [
+        {"data": "TEST123", "format": "code128"},
+        {"data": "12345", "format": "ean13"},
+        {"data": "123456789012", "format": "ean13", "return_format": "image"},
+    ]}
+    response = await client.post("/create-barcode/batch", json=payload)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["success"] == False
+    assert data["count"] == 2
+    assert [result["success"] for result in data["results"]] == [True, False, True]
+    assert [result["data"] for result in data["results"]] == ["TEST123", "12345", "123456789012"]
+    assert data["results"][1]["image_base64"] is None
+    assert "12 or 13 digits" in data["results"][1]["message"]
+    # Batch images are always base64, whatever return_format says
+    assert base64.b64decode(data["results"][2]["image_base64"]).startswith(b"\x89PNG")
+
+async def test_batch_size_limits(client):
+    """Batches must hold between 1 and MAX_BATCH_SIZE barcodes"""
+    response = await client.post("/create-barcode/batch", json={"barcodes": []})
+    assert response.status_code == 422
+    barcodes = [{"data": "TEST123", "format": "code128"}] * (main.MAX_BATCH_SIZE + 1)
+    response = await client.post("/create-barcode/batch", json={"barcodes": barcodes})
+    assert response.status_code == 422
+
+async def test_accept_svg(client):
+    """Accept: image/svg+xml selects SVG when image_format is not given"""
+    payload = {"data": "TEST123", "format": "code128", "return_format": "image"}
+    response = await client.post("/create-barcode", json=payload, headers={"Accept": "image/svg+xml"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/svg+xml"
+    assert b"<svg" in response.content
+    assert "Accept" in response.headers["vary"]
+    
+    # image/png in Accept, or an explicit image_format, keeps PNG
+    response = await client.post("/create-barcode", json=payload, headers={"Accept": "image/svg+xml, image/png"})
+    assert response.headers["content-type"] == "image/png"
+    response = await client.post("/create-barcode", json={**payload, "image_format": "png"}, headers={"Accept": "image/svg+xml"})
+    assert response.headers["content-type"] == "image/png"
+
+async def test_accept_svg_get(client):
+    """GET negotiates from Accept too, unless image_format is in the query"""
+    params = {"data": "TEST123", "format": "code128", "return_format": "image"}
+    response = await client.get("/create-barcode", params=params, headers={"Accept": "image/svg+xml"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/svg+xml"
+    response = await client.get("/create-barcode", params={**params, "image_format": "png"}, headers={"Accept": "image/svg+xml"})
+    assert response.headers["content-type"] == "image/png"
+    response = await client.get("/create-qr-code", params={"data": "TEST123", "return_format": "image"}, headers={"Accept": "image/svg+xml"})
+    assert response.headers["content-type"] == "image/svg+xml"
+
+@pytest.mark.parametrize("accept, content_type", [
+    ("image/png;q=0, image/svg+xml", "image/svg+xml"),
+    ("image/png;q=0.5, image/svg+xml", "image/svg+xml"),
+    ("image/png, image/svg+xml;q=0.8", "image/png"),
+    ("image/svg+xml;q=0, image/png;q=0", "image/png"),
+    ("image/svg+xml;q=0", "image/png"),
+])
+async def test_accept_quality_values(client, accept, content_type):
+    """Accept q-values pick the preferred format, q=0 meaning not acceptable"""
+    payload = {"data": "TEST123", "format": "code128", "return_format": "image"}
+    response = await client.post("/create-barcode", json=payload, headers={"Accept": accept})
+    assert response.headers["content-type"] == content_type
+
+async def test_accept_svg_qr_code(client):
+    """QR codes negotiate SVG the same way"""
+    payload = {"data": "TEST123", "return_format": "image"}
+    response = await client.post("/create-qr-code", json=payload, headers={"Accept": "image/svg+xml"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/svg+xml"
+
+@pytest.mark.parametrize("url, payload", [
+    ("/create-barcode", {"data": "TEST123>>??", "format": "code128"}),
+    ("/create-qr-code", {"data": "TEST123>>??"}),
+])
+async def test_url_safe_base64(client, url, payload):
+    """url_safe swaps the base64 alphabet without changing the image"""
+    standard = (await client.post(url, json=payload)).json()["image_base64"]
+    url_safe = (await client.post(url, json={**payload, "url_safe": True})).json()["image_base64"]
+    assert "+" not in url_safe and "/" not in url_safe
+    assert base64.urlsafe_b64decode(url_safe) == base64.b64decode(standard)
+
+async def test_url_safe_base64_batch(client):
+    """Batch items honour url_safe individually"""
+    payload = {"barcodes": [{"data": "TEST123>>??", "format": "code128", "url_safe": True}]}
+    image_base64 = (await client.post("/create-barcode/batch", json=payload)).json()["results"][0]["image_base64"]
+    assert "+" not in image_base64 and "/" not in image_base64
+    assert base64.urlsafe_b64decode(image_base64).startswith(b"\x89PNG")
+
+def repeated_rows(channels=None):
+    """Pixel rows in runs of identical rows, as barcode bars produce, plus some noise rows"""
+    rng = np.random.default_rng(0)
+    shape = (1, 57) if channels is None else (1, 57, channels)
+    bars = rng.integers(0, 2, shape, dtype=np.uint8) * 255
+    noise = rng.integers(0, 256, (5,) + shape[1:], dtype=np.uint8)
+    # Runs shorter than, equal to and longer than a repeat block
+    return np.concatenate([
+        np.repeat(bars, 3, axis=0),
+        noise,
+        np.repeat(255 - bars, main.REPEAT_BLOCK_ROWS, axis=0),
+        np.repeat(bars, 2 * main.REPEAT_BLOCK_ROWS + 5, axis=0),
+        noise[:1],
+    ])
+
+@pytest.mark.parametrize("pixels, mode", [
+    (repeated_rows(), "L"),
+    (repeated_rows(3), "RGB"),
+    (np.zeros((1, 1), dtype=np.uint8), "L"),
+])
+async def test_encode_png_round_trip(pixels, mode):
+    """encode_png output decodes back to the exact pixels"""
+    image = Image.open(io.BytesIO(main.encode_png(pixels)))
+    assert image.mode == mode
+    assert np.array_equal(np.asarray(image), pixels)
+
 # example_usage.py
 """
 Example usage of the Barcode Generator API
@@ -142,7 +451,7 @@ BASE_URL = "http://localhost:8000"
 
 def example_generate_barcode():
     """Example: Generate a Code 128 barcode"""
-    url = f"{BASE_URL}/generate"
+    url = f"{BASE_URL}/create-barcode"
     payload = {
         "data": "EXAMPLE123",
         "format": "code128",
@@ -169,7 +478,7 @@ def example_generate_barcode():
 
 def example_generate_upc():
     """Example: Generate a UPC barcode"""
-    url = f"{BASE_URL}/generate"
+    url = f"{BASE_URL}/create-barcode"
     payload = {
         "data": "12345678901",  # 11 digits for UPC
         "format": "upc"
@@ -184,7 +493,7 @@ def example_generate_upc():
 
 def example_generate_ean13():
     """Example: Generate an EAN-13 barcode"""
-    url = f"{BASE_URL}/generate"
+    url = f"{BASE_URL}/create-barcode"
     payload = {
         "data": "123456789012",  # 12 digits for EAN-13
         "format": "ean13"
@@ -199,10 +508,11 @@ def example_generate_ean13():
 
 def example_download_image():
     """Example: Download barcode as image file"""
-    url = f"{BASE_URL}/generate/image"
+    url = f"{BASE_URL}/create-barcode"
     payload = {
         "data": "DOWNLOAD123",
-        "format": "code128"
+        "format": "code128",
+        "return_format": "image"
     }
     
     response = requests.post(url, json=payload)
@@ -214,33 +524,32 @@ def example_download_image():
     else:
         print(f"Error: {response.text}")
 
-def example_quick_generate():
-    """Example: Quick generate with query parameters"""
-    url = f"{BASE_URL}/generate/quick"
-    params = {
-        "data": "QUICK123",
-        "format": "code128",
-        "return_image": False
+def example_generate_qr_code():
+    """Example: Generate a QR code"""
+    url = f"{BASE_URL}/create-qr-code"
+    payload = {
+        "data": "https://example.com",
+        "error_correction": "H"
     }
     
-    response = requests.get(url, params=params)
+    response = requests.post(url, json=payload)
     
     if response.status_code == 200:
-        print("Quick barcode generated successfully!")
-        print(response.json())
+        print("QR code generated successfully!")
+        print(response.json()["message"])
     else:
         print(f"Error: {response.text}")
 
 def example_get_formats():
     """Example: Get supported formats"""
-    url = f"{BASE_URL}/formats"
+    url = f"{BASE_URL}/supported-formats"
     
     response = requests.get(url)
     
     if response.status_code == 200:
         formats = response.json()
         print("Supported formats:")
-        for format_name in formats["supported_formats"]:
+        for format_name in formats["barcode_formats"]:
             print(f"- {format_name}")
     else:
         print(f"Error: {response.text}")
@@ -258,5 +567,5 @@ if __name__ == "__main__":
     example_generate_upc()
     example_generate_ean13()
     example_download_image()
-    example_quick_generate()
+    example_generate_qr_code()
 